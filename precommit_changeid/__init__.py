@@ -4,17 +4,46 @@ import logging
 import os
 import re
 import sys
-import uuid
 from typing import Dict, Tuple
 
 import precommit_message_preservation
 
 LOGGER = logging.getLogger("precommit-changeid")
 
+# Matches a Change-Id tag at the start of a line of a commit message.
+_CHANGE_ID_RE = re.compile(r"^Change-Id:\s*(I[0-9a-f]{8,40})", re.IGNORECASE | re.MULTILINE)
+
+# The comment git places in front of the 'git commit -v' section.
+_VERBOSE_MARKER = "\n# Please enter the commit message for your changes."
+
 
 def create_change_id() -> str:
 	"Create a Change-Id that Gerrit will accept."
-	return "I" + uuid.uuid4().hex + uuid.uuid4().hex[:8]
+	return "I" + os.urandom(20).hex()
+
+def _compose(current_message: str, previous_commit_message: str) -> Tuple[str, str, str]:
+	"""Combine the current and previously saved commit messages.
+
+	Returns:
+		The combined message without any Change-Id tag, the Change-Id found in
+		either message (or an empty string) and the 'git commit -v' verbose code.
+	"""
+	current_message, verbose_code = split_verbose_code(current_message)
+	# Remove any trailing whitespace so we don't have blank lines between our tags.
+	current_message = current_message.rstrip()
+	if previous_commit_message and current_message:
+		current_message, change_id = extract_change_id(current_message)
+		previous_commit_message, previous_change_id = extract_change_id(previous_commit_message)
+		change_id = change_id or previous_change_id
+		message = "".join((
+			current_message,
+			"\n# ==== previously saved message below ====\n",
+			previous_commit_message,
+		))
+	else:
+		message = current_message or previous_commit_message
+		message, change_id = extract_change_id(message)
+	return message.rstrip(), change_id, verbose_code
 
 def get_suggested_content(filename: str) -> str:
 	"""Get the full content suggested for the git commit message.
@@ -37,27 +66,14 @@ def get_suggested_content(filename: str) -> str:
 	except OSError:
 		current_message = ""
 
-	current_message, verbose_code = split_verbose_code(current_message)
-	# Remove any trailing whitespace so we don't have blank lines between our tags.
-	current_message = current_message.rstrip()
 	previous_commit_message = precommit_message_preservation.get_cached_message()
-	if previous_commit_message and current_message:
-		current_message, change_id = extract_change_id(current_message)
-		previous_commit_message, previous_change_id = extract_change_id(previous_commit_message)
-		change_id = change_id or previous_change_id
-		suggested = (current_message +
-			"\n# ==== previously saved message below ====\n" +
-			previous_commit_message)
-	else:
-		suggested = current_message or previous_commit_message
-		suggested, change_id = extract_change_id(suggested)
-
+	message, change_id, verbose_code = _compose(current_message, previous_commit_message)
 	change_id = change_id or create_change_id()
 	# Parse out the current tags and organize them appropriately
-	suggested = suggested.rstrip() + "\n\nChange-Id: " + change_id
+	parts = [message, "\n\nChange-Id: ", change_id]
 	if verbose_code:
-		suggested += verbose_code
-	return suggested
+		parts.append(verbose_code)
+	return "".join(parts)
 
 def extract_change_id(content: str) -> Tuple[str, str]:
 	"""Extract the Change-Id tag from a commit message, if any.
@@ -66,17 +82,22 @@ def extract_change_id(content: str) -> Tuple[str, str]:
 		The content without the Change-Id tag, if present, otherwise the full
 		content and an empty string.
 	"""
+	# Lines ahead of the first tag can't contain one, so skip splitting them.
+	first = _CHANGE_ID_RE.search(content)
+	if not first:
+		return content, ""
+	prefix = content[:first.start()]
 	lines = []
 	change_id = ""
-	for line in content.split("\n"):
-		match = re.match(r"^Change-Id:\s*(I[0-9a-f]{8,40})", line, re.IGNORECASE)
+	for line in content[first.start():].split("\n"):
+		match = _CHANGE_ID_RE.match(line)
 		if not match:
 			lines.append(line)
 			continue
 		new_line = line[:match.start()] + line[match.end():]
 		lines.append(new_line)
 		change_id = match.group(1)
-	return "\n".join(lines), change_id
+	return prefix + "\n".join(lines), change_id
 
 def has_editor() -> bool:
 	"Return whether or not git will be using an editor for the commit message."
@@ -116,7 +137,7 @@ def split_verbose_code(current_message: str) -> Tuple[str, str]:
 		The commit message before the '-v' comment section and the comments
 		and code after the '-v' comment section, as a tuple of text.
 	"""
-	index = current_message.find("\n# Please enter the commit message for your changes.")
+	index = current_message.find(_VERBOSE_MARKER)
 	if index == -1:
 		return (current_message, "")
 	return current_message[:index], current_message[index:]
@@ -1,15 +1,16 @@
 "Tests for the eureka_prepare_commit_message module"
-import contextlib
+import io
 import re
-from typing import Generator
+from typing import Any, Callable
 import unittest
 import unittest.mock
 
 from nose2.tools import params # type: ignore
+import precommit_message_preservation
 
 import precommit_changeid as pci
 
-SAMPLE_VERBOSE_COMMIT_LINES = [
+SAMPLE_VERBOSE_COMMIT_LINES = (
 		"This is some summary line.",
 		"",
 		"You'll notice that even though this is just a test I have ",
@@ -33,32 +34,76 @@ SAMPLE_VERBOSE_COMMIT_LINES = [
 		"+++ b/.pre-commit-config.yaml",
 		"@@ -31,13 +31,13 @@ repos:",
 		"...and so on.",
-	]
+	)
 SAMPLE_VERBOSE_COMMIT = "\n".join(SAMPLE_VERBOSE_COMMIT_LINES)
 SAMPLE_VERBOSE_COMMIT_CONTENT = "\n".join(SAMPLE_VERBOSE_COMMIT_LINES[:5])
 SAMPLE_VERBOSE_COMMIT_DIFF = "\n" + "\n".join(SAMPLE_VERBOSE_COMMIT_LINES[5:])
-
-@contextlib.contextmanager
-def fake_cached_message(message: str) -> Generator[None, None, None]:
+EXPECTED_VERBOSE_NO_CACHE = (SAMPLE_VERBOSE_COMMIT_CONTENT + "\n\n" +
+	"Change-Id: Iabcde1234567890" +
+	SAMPLE_VERBOSE_COMMIT_DIFF)
+EXPECTED_VERBOSE_WITH_CACHE = (SAMPLE_VERBOSE_COMMIT_CONTENT + "\n" +
+	"# ==== previously saved message below ====\n" +
+	"Some summary.\n\n" +
+	"Some body\n\n" +
+	"Change-Id: Iabcde1234567890" +
+	SAMPLE_VERBOSE_COMMIT_DIFF)
+CHANGE_ID_BLANK_LINE_AFTER = (
+	"A summary line\n"
+	"\n"
+	"Some detailed message line.\n"
+	"Change-Id: I0102030405060708090001020304050607080900\n"
+)
+CHANGE_ID_BLANK_LINE_BEFORE = (
+	"A summary line\n"
+	"\n"
+	"Some detailed message line.\n"
+	"\n"
+	"Change-Id: I0102030405060708090001020304050607080900"
+)
+CHANGE_ID_BLANK_LINE_BOTH = (
+	"A summary line\n"
+	"\n"
+	"Some detailed message line.\n"
+	"\n"
+	"Change-Id: I0102030405060708090001020304050607080900\n"
+	"\n"
+)
+CHANGE_ID_BLANK_LINE_EXPECTED = CHANGE_ID_BLANK_LINE_BEFORE
+
+_CHANGE_ID_CASE_VARIANTS = ("Change-Id", "CHANGE-ID", "change-id")
+
+_CHANGEID_TEST_RE = re.compile(r"Change-Id: (?P<changeid>\w+)")
+
+class _Swap:
+	"Replace an attribute of a module for the duration of a 'with' block."
+	def __init__(self, module: Any, name: str, value: Any) -> None:
+		self.module = module
+		self.name = name
+		self.value = value
+		self.old = None
+
+	def __enter__(self) -> None:
+		self.old = getattr(self.module, self.name)
+		setattr(self.module, self.name, self.value)
+
+	def __exit__(self, *exc_info: Any) -> None:
+		setattr(self.module, self.name, self.old)
+
+
+def _fake_open(message: str) -> Callable[..., io.StringIO]:
+	"Build a replacement for open() that reads back the provided message."
+	return lambda *args, **kwargs: io.StringIO(message)
+
+
+def fake_cached_message(message: str) -> _Swap:
 	"Patch the routine to get the cached message to return something."
-	with unittest.mock.patch(
-		"precommit_message_preservation.get_cached_message",
-		return_value=message):
-		yield
-
-
-@contextlib.contextmanager
-def fake_current_message(message: str) -> Generator[None, None, None]:
-	"Patch the routine to get the current message to return something."
-	with unittest.mock.patch("builtins.open", unittest.mock.mock_open(read_data=message)):
-		yield
+	return _Swap(precommit_message_preservation, "get_cached_message",
+		lambda *args, **kwargs: message)
 
 
-@contextlib.contextmanager
-def specific_change_id(change_id: str) -> Generator[None, None, None]:
+def specific_change_id(change_id: str) -> _Swap:
 	"Make sure that a specific commit Id tag is generated."
-	with unittest.mock.patch("precommit_changeid.create_change_id", return_value=change_id):
-		yield
+	return _Swap(pci, "create_change_id", lambda *args, **kwargs: change_id)
 
 
 class ChangeIdTestBase(unittest.TestCase):
@@ -76,6 +121,21 @@ class ChangeIdTestBase(unittest.TestCase):
 
 class TestGetSuggestedContent(ChangeIdTestBase):
 	"Tests for all suggested commit message content."
+	_open_patcher: "unittest.mock._patch[unittest.mock.MagicMock]"
+	_open_mock: unittest.mock.MagicMock
+
+	@classmethod
+	def setUpClass(cls) -> None:
+		# Build the open() patch once and reuse it for every test. It behaves as
+		# though there is no commit message file until a test provides one.
+		cls._open_patcher = unittest.mock.patch("builtins.open", side_effect=FileNotFoundError)
+
+	def setUp(self) -> None:
+		self._open_mock = self._open_patcher.start()
+
+	def tearDown(self) -> None:
+		self._open_patcher.stop()
+
 	def test_previous_commit_message(self) -> None:
 		"Test that we use the previous commit message."
 		with fake_cached_message("Some summary"):
@@ -91,127 +151,75 @@ class TestGetSuggestedContent(ChangeIdTestBase):
 
 	def test_changeid_length(self) -> None:
 		"Does our suggested changeid have the proper length?"
+		self._open_mock.side_effect = _fake_open("Some summary\n\nmore information")
 		with fake_cached_message(""):
-			with fake_current_message("Some summary\n\nmore information"):
-				suggestion = pci.get_suggested_content("somefile")
-		match = re.search(r"Change-Id: (?P<changeid>\w+)", suggestion)
+			suggestion = pci.get_suggested_content("somefile")
+		match = _CHANGEID_TEST_RE.search(suggestion)
 		assert match
 		changeid = match.group("changeid")
 		self.assertEqual(len(changeid), 41)
 
 	def test_new_commit_message(self) -> None:
 		"Test that we honor what the user provided on the commandline via 'git commit -m"
+		self._open_mock.side_effect = _fake_open("Some summary\n\nmore information")
 		with fake_cached_message(""):
-			with fake_current_message("Some summary\n\nmore information"):
-				suggestion = pci.get_suggested_content("somefile")
+			suggestion = pci.get_suggested_content("somefile")
 			self.assertTrue(suggestion.startswith("Some summary\n\nmore information"))
 
 	def test_new_commit_message_and_previous(self) -> None:
 		"Test that we present both the current commit message and previous commit messages."
+		self._open_mock.side_effect = _fake_open("Some summary\n\nmore information")
 		with fake_cached_message("An old summary\n\nold details"):
-			with fake_current_message("Some summary\n\nmore information"):
-				suggestion = pci.get_suggested_content("somefile")
+			suggestion = pci.get_suggested_content("somefile")
 			self.assertTrue(suggestion.startswith("Some summary\n\nmore information"))
 			self.assertIn("An old summary\n\nold details", suggestion)
 			self.assertIn("previously saved message below", suggestion)
 
 	def test_verbose_commit_no_cached(self) -> None:
 		"When user specifies 'git commit -m \"something\" -v' we put everything in the right order."
+		self._open_mock.side_effect = _fake_open(SAMPLE_VERBOSE_COMMIT)
 		with fake_cached_message(""):
-			with fake_current_message(SAMPLE_VERBOSE_COMMIT):
-				with specific_change_id("Iabcde1234567890"):
-					suggestion = pci.get_suggested_content("somefile")
-		expected = (SAMPLE_VERBOSE_COMMIT_CONTENT + "\n\n" +
-			"Change-Id: Iabcde1234567890" +
-			SAMPLE_VERBOSE_COMMIT_DIFF)
-		self.assertEqual(suggestion, expected)
+			with specific_change_id("Iabcde1234567890"):
+				suggestion = pci.get_suggested_content("somefile")
+		self.assertEqual(suggestion, EXPECTED_VERBOSE_NO_CACHE)
 
 	def test_verbose_commit_with_cached(self) -> None:
 		"When user specifies 'git commit -m \"something\" -v' we put everything in the right order."
+		self._open_mock.side_effect = _fake_open(SAMPLE_VERBOSE_COMMIT)
 		with fake_cached_message("Some summary.\n\nSome body"):
-			with fake_current_message(SAMPLE_VERBOSE_COMMIT):
-				with specific_change_id("Iabcde1234567890"):
-					suggestion = pci.get_suggested_content("somefile")
-		expected = (SAMPLE_VERBOSE_COMMIT_CONTENT + "\n" +
-			"# ==== previously saved message below ====\n" +
-			"Some summary.\n\n" +
-			"Some body\n\n" +
-			"Change-Id: Iabcde1234567890" +
-			SAMPLE_VERBOSE_COMMIT_DIFF)
-		self.assertEqual(suggestion, expected)
-
-
-	def test_change_id_blank_line_after(self) -> None:
-		"Do we detect the Change-Id when present with a blank line after?"
-		message = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"Change-Id: I0102030405060708090001020304050607080900",
-			"",
-		))
-		with fake_current_message(message):
-			with fake_cached_message(""):
+			with specific_change_id("Iabcde1234567890"):
 				suggestion = pci.get_suggested_content("somefile")
-		expected = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"",
-			"Change-Id: I0102030405060708090001020304050607080900",
-		))
-		self.assertEqual(suggestion, expected)
+		self.assertEqual(suggestion, EXPECTED_VERBOSE_WITH_CACHE)
 
-	def test_change_id_blank_line_before(self) -> None:
-		"Do we detect the Change-Id when present with a blank line before?"
-		message = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"",
-			"Change-Id: I0102030405060708090001020304050607080900",
-		))
-		with fake_current_message(message):
-			with fake_cached_message(""):
-				suggestion = pci.get_suggested_content("somefile")
-		expected = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"",
-			"Change-Id: I0102030405060708090001020304050607080900",
-		))
-		self.assertEqual(suggestion, expected)
 
-	def test_change_id_blank_line_both(self) -> None:
-		"Do we detect the Change-Id when present with a blank line before?"
-		message = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"",
-			"Change-Id: I0102030405060708090001020304050607080900",
-		))
-		with fake_current_message(message):
-			with fake_cached_message(""):
-				suggestion = pci.get_suggested_content("somefile")
-		expected = "\n".join((
-			"A summary line",
-			"",
-			"Some detailed message line.",
-			"",
-			"Change-Id: I0102030405060708090001020304050607080900",
-		))
+	@params(
+		(CHANGE_ID_BLANK_LINE_AFTER, CHANGE_ID_BLANK_LINE_EXPECTED),
+		(CHANGE_ID_BLANK_LINE_BEFORE, CHANGE_ID_BLANK_LINE_EXPECTED),
+		(CHANGE_ID_BLANK_LINE_BOTH, CHANGE_ID_BLANK_LINE_EXPECTED),
+	)
+	def test_change_id_blank_line(self, message: str, expected: str) -> None:
+		"Do we detect the Change-Id when present with blank lines around it?"
+		self._open_mock.side_effect = _fake_open(message)
+		with fake_cached_message(""):
+			suggestion = pci.get_suggested_content("somefile")
 		self.assertEqual(suggestion, expected)
 
 class TestExtractTags(ChangeIdTestBase):
 	"Tests for logic around extracting tags."
 
-	@params(("Change-Id",), ("CHANGE-ID",), ("change-id",))
+	@params(*((variant,) for variant in _CHANGE_ID_CASE_VARIANTS))
 	def test_has_change_id_tag(self, name: str) -> None:
 		"Test we can detect change_id tags."
 		self.assert_has_changeid("Foo\n{}: I12345abcde".format(name), "I12345abcde")
 
+	def test_mixed_case_change_id_tag(self) -> None:
+		"Test we detect change_id tags regardless of the case of the key."
+		self.assert_has_changeid("Foo\nChange-ID: I12345abcde", "I12345abcde")
+
+	def test_uppercase_hex_change_id(self) -> None:
+		"Test we detect change_id values written in uppercase hex."
+		self.assert_has_changeid("Foo\nChange-Id: I12345ABCDE", "I12345ABCDE")
+
 	def test_no_change_id_tag(self) -> None:
 		"Test we can detect lack of change_id tag."
 		self.assert_not_has_changeid("No\nChange-Id\nTag")